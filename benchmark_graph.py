@@ -0,0 +1,104 @@
+"""Measures the dependency resolution time of a synthetic graph of packages requiring boost, and the
+number of distinct boost package IDs of configurations that produce the same binaries.
+
+    python benchmark_graph.py [--nodes 200] [--runs 3]
+
+It uses the local conan cache, under the bench/graph user and channel.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+USER_CHANNEL = "bench/graph"
+BOOST = "boost/1.66.0@%s" % USER_CHANNEL
+
+CONSUMER = """from conans import ConanFile
+
+
+class Pkg{n}Conan(ConanFile):
+    name = "pkg{n}"
+    version = "0.1"
+    settings = "os", "arch", "compiler", "build_type"
+    requires = {requires}
+"""
+
+# Whether each group produces the same package, so it must share the package ID
+EQUIVALENT_CONFIGURATIONS = [
+    (True, ["-o boost:shared=True -o boost:fPIC=True", "-o boost:shared=True -o boost:fPIC=False"]),
+    (True, ["-o boost:without_mpi=True", "-o boost:without_mpi=False"]),
+    (True, ["-o boost:without_graph_parallel=True", "-o boost:without_graph_parallel=False"]),
+    # Nothing to prune when the python headers are kept too
+    (True, ["-o boost:prune_headers=True -o boost:without_python=False",
+            "-o boost:prune_headers=False -o boost:without_python=False"]),
+    (True, ["-o boost:compiler_cache=none", "-o boost:compiler_cache=ccache"]),
+    (True, ["-o boost:header_only=True -o boost:without_iostreams=True",
+            "-o boost:header_only=True -o boost:without_iostreams=False"]),
+    # The pruned headers differ
+    (False, ["-o boost:prune_headers=True -o boost:without_mpi=True",
+             "-o boost:prune_headers=True -o boost:without_mpi=False"]),
+]
+
+
+def run(command):
+    return subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT).decode()
+
+
+def boost_package_id(options):
+    output = run("conan info %s %s --only id" % (BOOST, options))
+    match = re.search(r"^%s\s*\n\s*ID:\s*(\w+)" % re.escape(BOOST), output, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def create_graph(folder, nodes):
+    """Every package requires boost, the previous package and the one at half its index, so the
+    graph has `nodes` packages and many diamonds converging on boost"""
+    for n in range(nodes):
+        requires = [BOOST]
+        if n > 0:
+            requires.append("pkg%d/0.1@%s" % (n - 1, USER_CHANNEL))
+        if n > 1 and n // 2 != n - 1:
+            requires.append("pkg%d/0.1@%s" % (n // 2, USER_CHANNEL))
+        recipe_folder = os.path.join(folder, "pkg%d" % n)
+        os.makedirs(recipe_folder)
+        with open(os.path.join(recipe_folder, "conanfile.py"), "w") as f:
+            f.write(CONSUMER.format(n=n, requires=tuple(requires)))
+        run("conan export %s %s" % (recipe_folder, USER_CHANNEL))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    run("conan export %s %s" % (here, USER_CHANNEL))
+
+    print("Distinct boost package IDs of configurations:")
+    for equivalent, group in EQUIVALENT_CONFIGURATIONS:
+        ids = set(boost_package_id(options) for options in group)
+        expected = 1 if equivalent else len(group)
+        print("    %s %d of %d (expected %d): %s" % ("OK   " if len(ids) == expected else "WRONG", len(ids),
+                                                    len(group), expected, " | ".join(group)))
+
+    folder = tempfile.mkdtemp()
+    try:
+        create_graph(folder, args.nodes)
+        root = "pkg%d/0.1@%s" % (args.nodes - 1, USER_CHANNEL)
+        timings = []
+        for _ in range(args.runs):
+            start = time.time()
+            run("conan info %s --only id" % root)
+            timings.append(time.time() - start)
+        print("Resolution of %d packages requiring boost: best %.2fs, mean %.2fs over %d runs"
+              % (args.nodes, min(timings), sum(timings) / len(timings), len(timings)))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from conans import ConanFile
+import os
+
+
+class BoostDebugInfoConan(ConanFile):
+    """Debug info split out of a boost package built with split_debug, packaged with conan export-pkg
+    from BOOST_DEBUG_INFO_DIR/<boost package id> (build.py does it). The boost_package_id option
+    selects the boost package it belongs to, so it is only downloaded by who asks for it"""
+    name = "boost_debuginfo"
+    version = "1.66.0"
+    description = "Debug info of the Boost libraries built with split_debug"
+    url = "https://github.com/lasote/conan-boost"
+    license = "Boost Software License - Version 1.0. http://www.boost.org/LICENSE_1_0.txt"
+    options = {"boost_package_id": "ANY"}
+    default_options = "boost_package_id=none"
+
+    def package(self):
+        # .debug files, .dSYM bundles or copies of the static libraries
+        self.copy("*", dst="debug")
+
+    def package_info(self):
+        # e.g. gdb -iex "set debug-file-directory ${CONAN_USER_BOOST_DEBUGINFO_debug_dir}"
+        self.user_info.debug_dir = os.path.join(self.package_folder, "debug")
@@ -0,0 +1,26 @@
+from conans import ConanFile
+from boost_sources import get_sources
+
+
+class BoostHeadersConan(ConanFile):
+    """Boost headers, packaged once and required by every binary package of boost built with the
+    shared_headers option, so the binary packages do not carry their own copy"""
+    name = "boost_headers"
+    version = "1.66.0"
+    folder_name = "boost_%s" % version.replace(".", "_")
+    description = "Boost provides free peer-reviewed portable C++ source libraries (headers)"
+    url = "https://github.com/lasote/conan-boost"
+    license = "Boost Software License - Version 1.0. http://www.boost.org/LICENSE_1_0.txt"
+    exports = "boost_sources.py"
+    short_paths = True
+    no_copy_source = True
+
+    def source(self):
+        # Same archive as the boost recipe
+        get_sources(self)
+
+    def package(self):
+        self.copy(pattern="*", dst="include/boost", src="%s/boost" % self.folder_name)
+
+    def package_id(self):
+        self.info.header_only()
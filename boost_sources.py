@@ -0,0 +1,118 @@
+"""Boost source archive, fetched the same way by the boost (conanfile.py) and boost_headers
+(boost_headers.py) recipes, which export this file"""
+from conans import tools
+import os
+import shutil
+import uuid
+
+# sha256 of the archive of every extension
+archive_sha256 = {
+    ".zip": "e1c55ebb00886c1a96528e4024be98a38b815115f62ecfe878fcf587ba715aad",
+    ".tar.gz": "bd0df411efd9a585e5a2212275f8762079fed8842264954675a4fddc46cfcf60",
+}
+
+
+def get_sources(conanfile):
+    """Extracts the sources in the current folder. BOOST_SOURCE_CACHE and BOOST_SOURCE_MIRROR avoid the
+    download when they have the archive"""
+    extension = ".zip" if tools.os_info.is_windows else ".tar.gz"
+    sha256 = archive_sha256[extension]
+    zip_name = "%s%s" % (conanfile.folder_name, extension)
+    url = "https://dl.bintray.com/boostorg/release/%s/source/%s" % (conanfile.version, zip_name)
+    if not os.environ.get("BOOST_SOURCE_CACHE") and not os.environ.get("BOOST_SOURCE_MIRROR"):
+        tools.get(url, sha256=sha256)
+        return
+
+    archive = get_source_archive(conanfile, url, zip_name, sha256, extension)
+    if archive:
+        # Extract straight from the cached (or mirrored) archive, no intermediate copy
+        tools.unzip(archive)
+    else:
+        tools.get(url, sha256=sha256)
+
+
+def get_source_archive(conanfile, url, zip_name, sha256, extension):
+    """Returns a local path to the verified source archive, None when it is not mirrored and there
+    is no cache to download it to. The cache is content-addressed by sha256, so every build slot
+    sharing BOOST_SOURCE_CACHE downloads it only once"""
+    cache_dir = os.environ.get("BOOST_SOURCE_CACHE")
+    mirror_dir = os.environ.get("BOOST_SOURCE_MIRROR")
+
+    cached = None
+    if cache_dir:
+        cached = os.path.join(cache_dir, sha256[:2], sha256 + extension)
+        if os.path.exists(cached):
+            conanfile.output.info("Source archive cache hit: %s" % cached)
+            os.utime(cached, None)  # Most recently used, for the LRU eviction
+            return cached
+
+    mirrored = os.path.join(mirror_dir, zip_name) if mirror_dir else None
+    if mirrored and os.path.exists(mirrored):
+        conanfile.output.info("Using source archive from mirror: %s" % mirrored)
+        tools.check_sha256(mirrored, sha256)
+        if not cached:
+            return mirrored
+        tmp = cache_tmp_path(cached)
+        tools.mkdir(os.path.dirname(cached))
+        shutil.copyfile(mirrored, tmp)
+    elif cached:
+        tmp = cache_tmp_path(cached)
+        tools.mkdir(os.path.dirname(cached))
+        conanfile.output.info("Source archive cache miss, downloading %s" % url)
+        try:
+            tools.download(url, tmp)
+            tools.check_sha256(tmp, sha256)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    else:
+        conanfile.output.info("%s not found in BOOST_SOURCE_MIRROR (%s), downloading %s" % (zip_name, mirror_dir, url))
+        return None
+
+    atomic_move(tmp, cached)
+    evict_source_cache(conanfile, cache_dir, keep=cached)
+    return cached
+
+
+def cache_tmp_path(path):
+    # Unique per writer, so concurrent builders never write the same file
+    return "%s.%s.tmp" % (path, uuid.uuid4().hex)
+
+
+def atomic_move(tmp, dst):
+    try:
+        os.rename(tmp, dst)
+    except OSError:
+        # Windows refuses to overwrite, another builder already stored the same content
+        if not os.path.exists(dst):
+            raise
+        os.remove(tmp)
+
+
+def evict_source_cache(conanfile, cache_dir, keep):
+    max_size = int(os.environ.get("BOOST_SOURCE_CACHE_MAX_SIZE", "1024")) * 1024 * 1024
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for filename in files:
+            if filename.endswith(".tmp"):  # In progress by another builder
+                continue
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:  # Evicted concurrently
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+        conanfile.output.info("Evicting from source archive cache: %s" % path)
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_size -= size
@@ -1,6 +1,136 @@
 from conan.packager import ConanMultiPackager
+from multiprocessing.pool import ThreadPool
 import copy
+import multiprocessing
+import os
 import platform
+import re
+import subprocess
+import time
+
+
+def conan_args(settings, options, env_vars):
+    args = ["-s %s=%s" % item for item in sorted(settings.items())]
+    args.extend("-o %s=%s" % item for item in sorted(options.items()))
+    args.extend("-e %s=%s" % item for item in sorted((env_vars or {}).items()))
+    return " ".join(args)
+
+
+def package_id(reference, settings, options):
+    """Package ID of boost for the configuration, None if conan cannot compute it"""
+    try:
+        output = subprocess.check_output("conan info %s %s --only id"
+                                         % (reference, conan_args(settings, options, None)), shell=True)
+    except subprocess.CalledProcessError:
+        return None
+    match = re.search(r"^%s\s*\n\s*ID:\s*(\w+)" % re.escape(reference), output.decode(), re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def uses_docker():
+    # Like ConanMultiPackager, a docker image implies building in docker
+    return bool(os.getenv("CONAN_USE_DOCKER") or os.getenv("CONAN_DOCKER_IMAGE"))
+
+
+def total_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):  # Not available in Windows
+        return None
+
+
+def export_debug_info(username, channel):
+    """Packages the debug info of the split_debug builds as boost_debuginfo, one package per boost
+    package ID, from the folders written by the recipe"""
+    # Same default than conanfile.py
+    debug_dir = os.getenv("BOOST_DEBUG_INFO_DIR", os.path.join(os.path.expanduser("~"), ".boost_debug_info"))
+    if not os.path.isdir(debug_dir):
+        return
+    for boost_package_id in sorted(os.listdir(debug_dir)):
+        ret = os.system('conan export-pkg boost_debuginfo.py %s/%s -bf "%s" -o boost_debuginfo:boost_package_id=%s -f'
+                        % (username, channel, os.path.join(debug_dir, boost_package_id), boost_package_id))
+        if ret != 0:
+            raise Exception("Error packaging the debug info of %s" % boost_package_id)
+
+
+def run_local_matrix(builder, concurrency):
+    """Runs the configurations of the builder locally, up to `concurrency` at the same time:
+
+    - The recipe is exported once, and the first configuration runs alone, so all of them share the
+      source folder of the local cache.
+    - Configurations with the same package ID (e.g. header_only) are built only once.
+    - The build requirements of a configuration are applied with a profile including the default one.
+    - Ordered by compiler and shared before static, so the concurrent builds share the compiler cache.
+    - The total of compile jobs is limited by the CPUs and by the memory, at BOOST_MEMORY_PER_JOB_MB
+      (default 1024) per job, and split between the concurrent builds (CONAN_CPU_COUNT).
+    """
+    reference = "boost/1.66.0@%s/%s" % (builder.username, builder.channel)
+    if os.system("conan export . %s/%s" % (builder.username, builder.channel)) != 0:
+        raise Exception("Error exporting %s" % reference)
+
+    configurations, seen = [], set()
+    for build in builder.builds:
+        settings, options = build[0], build[1]
+        env_vars = build[2] if len(build) > 2 else {}
+        build_requires = build[3] if len(build) > 3 else {}
+        key = package_id(reference, settings, options) or conan_args(settings, options, env_vars)
+        if key in seen:
+            print("Skipping %s, same package as a previous configuration" % conan_args(settings, options, None))
+            continue
+        seen.add(key)
+        configurations.append((settings, options, env_vars, build_requires))
+    configurations.sort(key=lambda conf: (conf[0].get("compiler"), conf[0].get("compiler.version"),
+                                          not conf[1].get("boost:shared"), sorted(conf[0].items()),
+                                          sorted(conf[1].items())))
+
+    max_jobs = multiprocessing.cpu_count()
+    memory = total_memory_mb()
+    if memory:
+        max_jobs = max(1, min(max_jobs, memory // int(os.getenv("BOOST_MEMORY_PER_JOB_MB", "1024"))))
+    # So that concurrency * jobs <= max_jobs
+    concurrency = max(1, min(concurrency, max_jobs, len(configurations)))
+    jobs = max(1, max_jobs // concurrency)
+    print("Building %d configurations, %d at a time with %d jobs each" % (len(configurations), concurrency, jobs))
+
+    if not os.path.exists("build_logs"):
+        os.makedirs("build_logs")
+
+    def build_configuration(index):
+        settings, options, env_vars, build_requires = configurations[index]
+        args = conan_args(settings, options, env_vars)
+        log_path = os.path.join("build_logs", "%03d.log" % index)
+        if build_requires:
+            # The same build requirements than builder.run(), which also applies them with a profile
+            profile_path = os.path.abspath(os.path.join("build_logs", "%03d.profile" % index))
+            with open(profile_path, "w") as profile:
+                profile.write("include(default)\n\n[build_requires]\n")
+                for pattern, references in sorted(build_requires.items()):
+                    profile.write("%s: %s\n" % (pattern, ", ".join(references)))
+            args += ' -pr "%s"' % profile_path
+        env = dict(os.environ, CONAN_CPU_COUNT=str(jobs))
+        start = time.time()
+        with open(log_path, "w") as log:
+            log.write("%s\n" % args)
+            log.flush()
+            ret = subprocess.call("conan install %s --build=missing %s" % (reference, args),
+                                  shell=True, stdout=log, stderr=subprocess.STDOUT, env=env)
+            if ret == 0:
+                ret = subprocess.call("conan test test_package %s %s" % (reference, args),
+                                      shell=True, stdout=log, stderr=subprocess.STDOUT, env=env)
+        print("%s %6.0fs %s (%s)" % ("OK    " if ret == 0 else "FAILED", time.time() - start, args, log_path))
+        return ret == 0
+
+    if not configurations:
+        return
+    results = [build_configuration(0)]
+    pool = ThreadPool(concurrency)
+    try:
+        results.extend(pool.map(build_configuration, range(1, len(configurations))))
+    finally:
+        pool.close()
+        pool.join()
+    if not all(results):
+        raise Exception("%d configurations failed, see build_logs" % results.count(False))
 
 
 if __name__ == "__main__":
@@ -25,5 +155,25 @@ if __name__ == "__main__":
             filtered_builds.append([settings, new_options, env_vars, build_requires])
         builder.builds = filtered_builds
 
-    builder.run()
+    if os.getenv("BOOST_SHARED_HEADERS"):
+        # boost_headers only exists in the local cache: the docker containers cannot resolve it, and the
+        # packager would upload binary packages requiring a package missing in the remote
+        if uses_docker() or os.getenv("CONAN_UPLOAD"):
+            raise Exception("BOOST_SHARED_HEADERS cannot be used with docker (CONAN_USE_DOCKER, "
+                            "CONAN_DOCKER_IMAGE) nor with CONAN_UPLOAD")
+        # Package the headers once, every binary package requires them instead of carrying a copy
+        ret = os.system("conan create boost_headers.py %s/%s" % (builder.username, builder.channel))
+        if ret != 0:
+            raise Exception("Error creating boost_headers")
+        for settings, options in (build[:2] for build in builder.builds):
+            if not options.get("boost:header_only"):
+                options["boost:shared_headers"] = True
+
+    local_parallel = os.getenv("BOOST_LOCAL_PARALLEL")
+    if local_parallel and not uses_docker():
+        run_local_matrix(builder, int(local_parallel))
+    else:
+        builder.run()
+    if not uses_docker():  # Otherwise the debug info stays in the containers
+        export_debug_info(builder.username, builder.channel)
 
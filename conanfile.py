@@ -1,6 +1,20 @@
 from conans import ConanFile
 from conans import tools
+from boost_sources import atomic_move, cache_tmp_path, get_sources
+import hashlib
+import json
 import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 # From from *1 (see below, b2 --show-libraries), also ordered following linkage order
 # see https://github.com/Kitware/CMake/blob/master/Modules/FindBoost.cmake to know the order
@@ -11,6 +25,167 @@ lib_list = ['math', 'wave', 'container', 'exception', 'graph', 'iostreams', 'loc
             'atomic', 'filesystem', 'system', 'graph_parallel', 'python',
             'stacktrace', 'test', 'type_erasure']
 
+# Compiled Boost libraries each library of lib_list links against
+lib_dependencies = {
+    'chrono': ['system'],
+    'coroutine': ['context', 'system', 'thread'],
+    'fiber': ['context', 'filesystem', 'system'],
+    'filesystem': ['system'],
+    'graph': ['regex'],
+    'graph_parallel': ['mpi', 'graph', 'serialization', 'filesystem', 'system'],
+    'locale': ['thread', 'system'],
+    'log': ['filesystem', 'thread', 'date_time', 'regex', 'chrono', 'atomic', 'system'],
+    'mpi': ['serialization'],
+    'random': ['system'],
+    'thread': ['chrono', 'date_time', 'atomic', 'system'],
+    'timer': ['chrono', 'system'],
+    'type_erasure': ['thread', 'chrono', 'system'],
+    'wave': ['filesystem', 'thread', 'date_time', 'chrono', 'system'],
+}
+
+
+def transitive_dependencies(libname):
+    deps = set()
+    pending = list(lib_dependencies.get(libname, []))
+    while pending:
+        dep = pending.pop()
+        if dep not in deps:
+            deps.add(dep)
+            pending.extend(lib_dependencies.get(dep, []))
+    return deps
+
+
+# Library files, without the boost_ prefix, produced by the libraries of lib_list when they are not
+# simply named after the library, in linkage order
+lib_artifacts = {
+    'log': ['log_setup', 'log'],
+    'math': ['math_c99', 'math_c99f', 'math_c99l', 'math_tr1', 'math_tr1f', 'math_tr1l'],
+    'mpi': ['mpi_python', 'mpi'],
+    'python': ['numpy', 'python'],
+    'serialization': ['wserialization', 'serialization'],
+    'stacktrace': ['stacktrace_addr2line', 'stacktrace_backtrace', 'stacktrace_basic', 'stacktrace_noop',
+                   'stacktrace_windbg', 'stacktrace_windbg_cached'],
+    'test': ['unit_test_framework'],
+}
+
+# Written by package(), loaded by package_info()
+manifest_name = "boost_manifest.json"
+
+# Timing of the build phases and b2 actions, written in the build folder
+build_report_name = "build_report.json"
+source_timing_name = "source_timing.json"
+
+# They provide their own main(), never link them https://github.com/bincrafters/community/issues/94
+excluded_artifacts = ('prg_exec_monitor', 'test_exec_monitor')
+
+# Library file name (without the boost_ prefix) => (position in the linkage order, library)
+artifact_index = {}
+for _libname in lib_list:
+    for _artifact in lib_artifacts.get(_libname, [_libname]):
+        artifact_index[_artifact] = (len(artifact_index), _libname)
+
+
+def artifact_library(lib_file):
+    """(position in the linkage order, library) of a library file as found by tools.collect_libs(),
+    e.g. boost_regex, libboost_wserialization-mt or boost_python27. None if unknown"""
+    name = os.path.splitext(lib_file)[0].split("-")[0]
+    if name.startswith("lib"):
+        name = name[3:]
+    if name.startswith("boost_"):
+        name = name[6:]
+    # Python libraries are suffixed with the Python version (boost_python27, boost_numpy3)
+    return artifact_index.get(name) or artifact_index.get(name.rstrip("0123456789"))
+
+
+# Header paths, relative to boost/, only used by the given compiled library, so they can be left out
+# of the package when the library is not built
+lib_headers = {
+    'fiber': ['fiber'],
+    'graph_parallel': ['graph/distributed'],
+    'locale': ['locale', 'locale.hpp'],
+    'log': ['log'],
+    'mpi': ['mpi', 'mpi.hpp'],
+    'python': ['python', 'python.hpp'],
+    'signals': ['signals', 'signals.hpp'],
+    'wave': ['wave', 'wave.hpp'],
+}
+
+# Headers of the precompiled header, with the library they require, if any
+pch_headers = [
+    ("boost/algorithm/string.hpp", None),
+    ("boost/bind.hpp", None),
+    ("boost/format.hpp", None),
+    ("boost/function.hpp", None),
+    ("boost/lambda/lambda.hpp", None),
+    ("boost/lexical_cast.hpp", None),
+    ("boost/make_shared.hpp", None),
+    ("boost/optional.hpp", None),
+    ("boost/shared_ptr.hpp", None),
+    ("boost/variant.hpp", None),
+    ("boost/date_time/posix_time/posix_time.hpp", "date_time"),
+    ("boost/filesystem.hpp", "filesystem"),
+    ("boost/regex.hpp", "regex"),
+    ("boost/thread.hpp", "thread"),
+]
+
+pch_cmake = """# Precompiled Boost headers matching this package configuration
+set(BOOST_PCH_HEADER "${CMAKE_CURRENT_LIST_DIR}/boost_pch.hpp")
+
+# Includes the precompiled headers in every source of the target. Only with GCC, which falls back to the
+# regular headers when the compile flags do not match, other compilers reject the precompiled header
+function(boost_target_precompiled_headers target)
+    if(CMAKE_CXX_COMPILER_ID STREQUAL "GNU")
+        target_compile_options(${target} PRIVATE -include "${BOOST_PCH_HEADER}")
+    else()
+        message(STATUS "Boost precompiled headers need GCC, not used for ${target}")
+    endif()
+endfunction()
+"""
+
+# Compiled libraries needed by a boost/<path> include when it is not simply boost/<libname>.
+# The longest matching path wins
+include_libraries = {
+    'archive': ['serialization'],
+    'asio': ['system'],
+    'beast': ['system'],
+    'coroutine2': ['context'],
+    'cregex': ['regex'],
+    'dll': ['filesystem', 'system'],
+    'exception': [],  # exception_ptr works header only
+    'graph': [],
+    'graph/distributed': ['graph_parallel'],
+    'graph/graphml': ['graph'],
+    'graph/graphviz': ['graph'],
+    'math': [],
+    'math/tr1': ['math'],
+    'process': ['filesystem', 'system'],
+}
+
+source_extensions = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.h', '.hh', '.hpp', '.hxx', '.h++', '.ipp', '.inl')
+
+
+def scan_boost_libraries(folders):
+    """Compiled libraries used by the #include <boost/...> directives of the given source trees"""
+    include_re = re.compile(r'#\s*include\s*[<"]boost/([\w/.]+)[>"]')
+    found = set()
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                if not filename.lower().endswith(source_extensions):
+                    continue
+                with open(os.path.join(root, filename), "rb") as f:
+                    content = f.read().decode("utf-8", "ignore")
+                for include in set(include_re.findall(content)):
+                    parts = os.path.splitext(include)[0].split("/")
+                    for n in range(len(parts), 0, -1):
+                        if "/".join(parts[:n]) in include_libraries:
+                            found.update(include_libraries["/".join(parts[:n])])
+                            break
+                    else:
+                        if parts[0] in lib_list:
+                            found.add(parts[0])
+    return found
+
 
 class BoostConan(ConanFile):
     name = "boost"
@@ -23,11 +198,31 @@ class BoostConan(ConanFile):
     options = {
         "shared": [True, False],
         "header_only": [True, False],
-        "fPIC": [True, False]
+        "fPIC": [True, False],
+        "compiler_cache": ["none", "ccache", "sccache"],
+        "build_scheduler": ["monolithic", "per_library"],
+        "required_libraries": "ANY",
+        "headers_packaging": ["copy", "link"],
+        "prune_headers": [True, False],
+        "shared_headers": [True, False],
+        "lto": [True, False],
+        "pgo": [True, False],
+        "cpu_target": ["generic", "haswell", "skylake-avx512", "native"],
+        "multi_variant": [True, False],
+        "precompiled_headers": [True, False],
+        "strip": [True, False],
+        "split_debug": [True, False],
+        "gc_sections": [True, False]
     }
     options.update({"without_%s" % libname: [True, False] for libname in lib_list})
 
-    default_options = ["shared=False", "header_only=False", "fPIC=False"]
+    default_options = ["shared=False", "header_only=False", "fPIC=False", "compiler_cache=none",
+                       "build_scheduler=monolithic", "required_libraries=all",
+                       "headers_packaging=copy", "prune_headers=False",
+                       "shared_headers=False", "lto=False", "pgo=False",
+                       "cpu_target=generic", "multi_variant=False",
+                       "precompiled_headers=False", "strip=False", "split_debug=False",
+                       "gc_sections=False"]
     default_options.extend(["without_%s=False" % libname for libname in lib_list if libname != "python"])
     default_options.append("without_python=True")
     default_options = tuple(default_options)
@@ -36,16 +231,46 @@ class BoostConan(ConanFile):
     license = "Boost Software License - Version 1.0. http://www.boost.org/LICENSE_1_0.txt"
     short_paths = True
     no_copy_source = False
+    exports = "boost_sources.py"
+    exports_sources = "pgo/*"
+
+    # Libraries exercised by pgo/training.cpp
+    pgo_trained_libs = ["regex", "filesystem", "iostreams", "serialization"]
 
     def config_options(self):
+        if self.settings.compiler != "gcc":
+            # Clang refuses a precompiled header built with other flags instead of ignoring it
+            self.options.remove("precompiled_headers")
         if self.settings.compiler == "Visual Studio":
             self.options.remove("fPIC")
+            self.options.remove("lto")
+            self.options.remove("pgo")
+            self.options.remove("strip")
+            self.options.remove("split_debug")
+            self.options.remove("gc_sections")
 
     @property
     def zip_bzip2_requires_needed(self):
         return not self.options.without_iostreams and not self.options.header_only
 
     def configure(self):
+        self._prune_unused_libraries()
+        self._validate_cpu_target()
+        if self.options.multi_variant and not self.options.header_only:
+            if self.options.get_safe("pgo") or self.options.build_scheduler != "monolithic":
+                raise Exception("multi_variant cannot be combined with pgo or build_scheduler=per_library")
+            if str(self.settings.build_type) not in ("Debug", "Release"):
+                raise Exception("multi_variant only builds the Debug and Release build types")
+        if self.options.get_safe("pgo") and not self.options.header_only:
+            if self.options.build_scheduler != "monolithic":
+                raise Exception("pgo cannot be combined with build_scheduler=per_library")
+            if tools.cross_building(self.settings):
+                raise Exception("pgo cannot be used when cross building, the training runs on the build machine")
+
+        if self.options.shared_headers and not self.options.header_only:
+            # The headers are packaged once in boost_headers (see boost_headers.py)
+            self.requires("boost_headers/%s@%s/%s" % (self.version, self.user, self.channel))
+
         if self.zip_bzip2_requires_needed:
             self.requires("bzip2/1.0.6@conan/stable")
             self.options["bzip2"].shared = False
@@ -53,21 +278,82 @@ class BoostConan(ConanFile):
             self.requires("zlib/1.2.11@conan/stable")
             self.options["zlib"].shared = False
 
+    def _validate_cpu_target(self):
+        cpu_target = str(self.options.cpu_target)
+        if cpu_target == "generic" or self.options.header_only:
+            return
+        if self.settings.arch not in ("x86", "x86_64"):
+            raise Exception("cpu_target=%s is only available for x86 and x86_64" % cpu_target)
+        if cpu_target == "native" and self.settings.compiler == "Visual Studio":
+            raise Exception("cpu_target=native is not available with Visual Studio")
+        if cpu_target == "skylake-avx512" and self.settings.compiler == "Visual Studio" and \
+                self.settings.compiler.version != "15":
+            # Older versions have no /arch:AVX512
+            raise Exception("cpu_target=skylake-avx512 requires Visual Studio 15")
+        if cpu_target == "skylake-avx512" and self.settings.compiler == "gcc" and \
+                int(str(self.settings.compiler.version).split(".")[0]) < 6:
+            raise Exception("cpu_target=skylake-avx512 requires gcc >= 6")
+
+    def _prune_unused_libraries(self):
+        """Replaces the without_* options with the closure of the libraries the consumer needs:
+        the comma separated required_libraries option plus the ones included by the sources found
+        in BOOST_SCAN_SOURCES (a list of folders separated like PATH)"""
+        required = set()
+        if str(self.options.required_libraries) != "all":
+            required = set(lib.strip() for lib in str(self.options.required_libraries).split(",")
+                           if lib.strip())
+            unknown = required - set(lib_list)
+            if unknown:
+                raise Exception("Unknown required_libraries: %s" % ", ".join(sorted(unknown)))
+        scan_folders = [folder for folder in os.environ.get("BOOST_SCAN_SOURCES", "").split(os.pathsep)
+                        if folder]
+        if scan_folders:
+            scanned = scan_boost_libraries(scan_folders)
+            self.output.info("Boost libraries used by %s: %s"
+                             % (", ".join(scan_folders), ", ".join(sorted(scanned)) or "none"))
+            required |= scanned
+        elif str(self.options.required_libraries) == "all":
+            return
+
+        needed = set(required)
+        for libname in required:
+            needed |= transitive_dependencies(libname)
+        self.output.info("Building only: %s" % (", ".join(sorted(needed)) or "none"))
+        for libname in lib_list:
+            setattr(self.options, "without_%s" % libname, libname not in needed)
+
     def package_id(self):
+        # The compiler cache launcher never changes the generated binaries
+        del self.info.options.compiler_cache
+        del self.info.options.build_scheduler
+        # Already reflected in the without_* options it derives
+        del self.info.options.required_libraries
+        # Linked or copied, the packaged headers are the same
+        del self.info.options.headers_packaging
         if self.options.header_only:
             self.info.header_only()
+            return
 
-    def source(self):
-        if tools.os_info.is_windows:
-            sha256 = "e1c55ebb00886c1a96528e4024be98a38b815115f62ecfe878fcf587ba715aad"
-            extension = ".zip"
-        else:
-            sha256 = "bd0df411efd9a585e5a2212275f8762079fed8842264954675a4fddc46cfcf60"
-            extension = ".tar.gz"
+        # Collapse the options that cannot change the binaries, so equivalent configurations
+        # share the same prebuilt package:
+        # - Shared libraries are always position independent
+        if self.options.shared and self.options.get_safe("fPIC") is not None:
+            del self.info.options.fPIC
+        # - Nothing to prune when all the libraries with their own headers are built. MPI is never
+        #   configured in user-config.jam, so b2 never builds mpi nor graph_parallel: their options
+        #   only matter for the headers they prune
+        if not self._pruned_headers():
+            del self.info.options.prune_headers
+            del self.info.options.without_mpi
+            del self.info.options.without_graph_parallel
 
-        zip_name = "%s%s" % (self.folder_name, extension)
-        url = "https://dl.bintray.com/boostorg/release/%s/source/%s" % (self.version, zip_name)
-        tools.get(url, sha256=sha256)
+    def source(self):
+        start = time.time()
+        get_sources(self)
+        # Picked up, and removed, by the report of the next build. The path is the one of the source
+        # folder, build() may only see a copy of it
+        tools.save(source_timing_name, json.dumps({"start": start, "end": time.time(),
+                                                   "path": os.path.abspath(source_timing_name)}))
 
     ##################### BUILDING METHODS ###########################
 
@@ -75,27 +361,341 @@ class BoostConan(ConanFile):
         if self.options.header_only:
             self.output.warn("Header only package, skipping build")
             return
+        if self.options.cpu_target == "native" and os.environ.get("CONAN_UPLOAD"):
+            # Only a heuristic, it does not prevent a manual conan upload
+            raise Exception("cpu_target=native packages only run on the machine that built them, "
+                            "they must not be uploaded (CONAN_UPLOAD is set)")
 
-        b2_exe = self.bootstrap()
+        # A new report for every build
+        for filename in os.listdir(self.build_folder):
+            if filename.startswith("b2-actions-") or filename.startswith(os.path.splitext(build_report_name)[0]):
+                os.remove(os.path.join(self.build_folder, filename))
+        # Only the build that follows source() reports it, the sources are reused by the next ones
+        source_timing = os.path.join(self.source_folder, source_timing_name)
+        if os.path.exists(source_timing):
+            timing = json.loads(tools.load(source_timing))
+            if os.path.abspath(source_timing) != timing["path"]:
+                os.remove(source_timing)  # The copy in the build folder
+            try:
+                os.remove(timing["path"])
+            except OSError:
+                pass  # Already reported by another build
+            else:
+                self._record_phase("source", timing["start"], timing["end"])
+
+        with self._timed_phase("bootstrap"):
+            b2_exe = self.bootstrap()
         flags = self.get_build_flags()
         # Help locating bzip2 and zlib
-        self.create_user_config_jam(self.build_folder)
+        with self._timed_phase("user-config.jam"):
+            self.create_user_config_jam(self.build_folder)
+        sources = os.path.join(self.source_folder, self.folder_name)
 
+        with tools.vcvars(self.settings) if self.settings.compiler == "Visual Studio" else tools.no_op():
+            with tools.chdir(sources):
+                # to locate user config jam (BOOST_BUILD_PATH)
+                env = {"BOOST_BUILD_PATH": self.build_folder}
+                env.update(self._compiler_cache_env())
+                with tools.environment_append(env):
+                    self._compiler_cache_command("zero")
+                    try:
+                        # To show the libraries *1
+                        # self.run("%s --show-libraries" % b2_exe)
+                        with self._timed_phase("b2"):
+                            if self.options.multi_variant:
+                                self._build_multi_variant(b2_exe, flags)
+                            elif self.options.get_safe("pgo"):
+                                self._build_with_pgo(b2_exe, flags)
+                            elif self.options.build_scheduler == "per_library":
+                                self._build_per_library(b2_exe, flags)
+                            else:
+                                self.run(self._b2_command(b2_exe, flags, tools.cpu_count()))
+                    finally:
+                        self._compiler_cache_command("stats")
+                        self._record_b2_actions()
+
+                if self.options.get_safe("precompiled_headers"):
+                    with self._timed_phase("precompiled headers"):
+                        self._build_precompiled_headers(flags)
+
+    def _b2_command(self, b2_exe, flags, jobs, build_dir=None, build_pass="build"):
         # JOIN ALL FLAGS
         b2_flags = " ".join(flags)
-        full_command = "%s %s -j%s --abbreviate-paths -d2" % (b2_exe, b2_flags, tools.cpu_count())
+        full_command = "%s %s -j%s --abbreviate-paths -d2" % (b2_exe, b2_flags, jobs)
         # -d2 is to print more debug info and avoid travis timing out without output
-        sources = os.path.join(self.source_folder, self.folder_name)
-        full_command += ' --debug-configuration --build-dir="%s"' % self.build_folder
+        full_command += ' --debug-configuration --build-dir="%s"' % (build_dir or self.build_folder)
+        # Timing of every action, for the build report, tagged with the pass building the same sources
+        full_command += ' --out-xml="%s"' % os.path.join(self.build_folder, "b2-actions-%s-%s.xml"
+                                                         % (build_pass, uuid.uuid4().hex[:8]))
         self.output.warn(full_command)
+        return full_command
 
-        with tools.vcvars(self.settings) if self.settings.compiler == "Visual Studio" else tools.no_op():
-            with tools.chdir(sources):
-                # to locate user config jam (BOOST_BUILD_PATH)
-                with tools.environment_append({"BOOST_BUILD_PATH": self.build_folder}):
-                    # To show the libraries *1
-                    # self.run("%s --show-libraries" % b2_exe)
-                    self.run(full_command)
+    def _multi_variant_staging(self, flags):
+        """Staging folder shared by the configurations only differing in build_type and shared"""
+        staging_root = os.environ.get("BOOST_MULTI_VARIANT_STAGING")
+        if not staging_root:
+            raise Exception("multi_variant requires BOOST_MULTI_VARIANT_STAGING, the folder shared "
+                            "by the builds of the different variants")
+        common_flags = [flag for flag in flags if not flag.startswith(("variant=", "link="))]
+        key = json.dumps([self.version, str(self.settings.os), str(self.settings.arch),
+                          str(self.settings.compiler), str(self.settings.compiler.version),
+                          sorted(common_flags)])
+        return os.path.join(staging_root, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+    def _build_multi_variant(self, b2_exe, flags):
+        """Builds the debug and release, static and shared variants in a single b2 run into a staging
+        folder, so the other configurations with the same settings and options only package them"""
+        staging = self._multi_variant_staging(flags)
+        complete = os.path.join(staging, "complete")
+        with self._staging_lock(staging):
+            if os.path.exists(complete):
+                self.output.info("Variants already built in %s" % staging)
+                return
+            # The tagged layout gives a different name to every variant
+            flags = [flag for flag in flags if not flag.startswith(("variant=", "link=", "--layout="))]
+            flags.extend(["variant=debug,release", "link=static,shared", "threading=multi",
+                          "--layout=tagged", '--stagedir="%s"' % staging])
+            self.run(self._b2_command(b2_exe, flags, tools.cpu_count(),
+                                      build_dir=os.path.join(staging, "build")))
+            tools.save(complete, "")
+
+    @contextmanager
+    def _staging_lock(self, staging):
+        lock = staging + ".lock"
+        tools.mkdir(os.path.dirname(lock))
+        while True:
+            try:
+                os.mkdir(lock)
+                break
+            except OSError:
+                self.output.info("Waiting for another build of the variants (remove %s if stale)" % lock)
+                time.sleep(10)
+        try:
+            yield
+        finally:
+            os.rmdir(lock)
+
+    def _package_multi_variant(self):
+        """Copies the variant of this configuration from the staging folder. The tagged names are kept,
+        they are the ones recorded in the shared libraries (SONAME, install name, import library)"""
+        staging_lib = os.path.join(self._multi_variant_staging(self.get_build_flags()), "lib")
+        debug = self.settings.build_type == "Debug"
+        for filename in sorted(os.listdir(staging_lib)):
+            name, tags, ext = self._split_tagged_name(filename)
+            if tags is None:
+                continue
+            if debug != any(tag != "mt" and "d" in tag for tag in tags):
+                continue
+            static = ext == ".a" or (ext == ".lib" and name.startswith("lib"))
+            if static == bool(self.options.shared):
+                continue
+            dst = os.path.join(self.package_folder, "bin" if ext == ".dll" else "lib", filename)
+            tools.mkdir(os.path.dirname(dst))
+            src = os.path.join(staging_lib, filename)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+            else:
+                shutil.copy2(src, dst)
+
+    @staticmethod
+    def _split_tagged_name(filename):
+        """libboost_regex-mt-d.so.1.66.0 => ('libboost_regex', ['mt', 'd'], '.so.1.66.0')"""
+        if "-" not in filename:
+            return filename, None, ""
+        name, rest = filename.split("-", 1)
+        tags, _, ext = rest.partition(".")
+        return name, tags.split("-"), "." + ext
+
+    def _build_with_pgo(self, b2_exe, flags):
+        """Builds instrumented libraries, runs pgo/training.cpp linked against them and builds them
+        again using the recorded profile. Both builds are monolithic"""
+        profile_dir = os.path.join(self.build_folder, "pgo-profile")
+        clang = "clang" in str(self.settings.compiler)
+        generate = "-fprofile-generate=%s" % profile_dir if clang else "-fprofile-generate"
+        self.output.info("PGO: building instrumented libraries")
+        with self._timed_phase("pgo instrumented build"):
+            self.run(self._b2_command(b2_exe, flags + ['cxxflags="%s"' % generate, 'linkflags="%s"' % generate],
+                                      tools.cpu_count(), build_pass="pgo-instrumented"))
+
+        self.output.info("PGO: running the training workload")
+        with self._timed_phase("pgo training"):
+            self._pgo_train(flags, generate)
+
+        if clang:
+            profdata = os.path.join(profile_dir, "boost.profdata")
+            llvm_profdata = "xcrun llvm-profdata" if self.settings.compiler == "apple-clang" else \
+                self._find_tool(["llvm-profdata-%s" % self.settings.compiler.version, "llvm-profdata"])
+            self.run('%s merge -output="%s" "%s"' % (llvm_profdata, profdata, profile_dir))
+            use = "-fprofile-use=%s" % profdata
+        else:
+            # The .gcda files are next to the objects, which are built again in the same place
+            use = "-fprofile-use -fprofile-correction"
+        self.output.info("PGO: building optimized libraries")
+        with self._timed_phase("pgo optimized build"):
+            self.run(self._b2_command(b2_exe, flags + ['cxxflags="%s"' % use, 'linkflags="%s"' % use, "-a"],
+                                      tools.cpu_count(), build_pass="pgo-optimized"))
+
+    def _pgo_train(self, flags, generate):
+        trained = [lib for lib in self.pgo_trained_libs if not getattr(self.options, "without_%s" % lib)]
+        if not trained:
+            self.output.warn("PGO: none of %s is built, nothing to train" % ", ".join(self.pgo_trained_libs))
+            return
+        compile_flags, link_flags = self._compiler_flags(flags)
+        compile_flags.extend([generate, "-O2"])
+        link_flags.append(generate)
+        compile_flags.extend("-DTRAIN_%s" % lib.upper() for lib in trained)
+        libs = trained + ([] if self.options.without_system else ["system"])
+        lib_paths = [os.path.join(self.source_folder, self.folder_name, "stage", "lib")]
+        if self.zip_bzip2_requires_needed:
+            for dep in ("zlib", "bzip2"):
+                if dep == "bzip2" and self.settings.os not in ("Linux", "Macos"):
+                    continue  # See create_user_config_jam()
+                lib_paths.extend(self.deps_cpp_info[dep].lib_paths)
+                libs.extend(self.deps_cpp_info[dep].libs)
+                if dep == "bzip2":
+                    compile_flags.append("-DTRAIN_BZIP2")
+        libs = ["boost_%s" % lib if lib in lib_list else lib for lib in libs]
+
+        trainer = os.path.join(self.build_folder, "pgo-training")
+        self.run('%s %s -I"%s" "%s" -o "%s" %s %s %s -pthread'
+                 % (self._cxx_executable(), " ".join(compile_flags),
+                    os.path.join(self.source_folder, self.folder_name),
+                    os.path.join(self.source_folder, "pgo", "training.cpp"), trainer,
+                    " ".join(link_flags), " ".join('-L"%s"' % path for path in lib_paths),
+                    " ".join("-l%s" % lib for lib in libs)))
+        library_path = "DYLD_LIBRARY_PATH" if self.settings.os == "Macos" else "LD_LIBRARY_PATH"
+        with tools.environment_append({library_path: lib_paths}):
+            self.run('"%s"' % trainer)
+
+    @staticmethod
+    def _compiler_flags(flags):
+        """Compile and link flags of the b2 flags, to build with the same ABI than the libraries"""
+        compile_flags, link_flags = [], []
+        for flag in flags:
+            if flag.startswith("define="):
+                compile_flags.append("-D%s" % flag[len("define="):])
+            elif flag.startswith('cxxflags="'):
+                compile_flags.append(flag[len('cxxflags="'):-1])
+            elif flag.startswith('linkflags="'):
+                link_flags.append(flag[len('linkflags="'):-1])
+        return compile_flags, link_flags
+
+    def _build_precompiled_headers(self, flags):
+        """Precompiles the headers of pch_headers with the flags of this configuration, plus the
+        CMake defaults for the build type and the package defines, as consumers will use them"""
+        folder = os.path.join(self.build_folder, "pch")
+        headers = [header for header, libname in pch_headers
+                   if not libname or not getattr(self.options, "without_%s" % libname)]
+        tools.save(os.path.join(folder, "boost_pch.hpp"),
+                   "%s\n" % "\n".join("#include <%s>" % header for header in headers))
+        tools.save(os.path.join(folder, "boost_pch.cmake"), pch_cmake)
+
+        compile_flags, _ = self._compiler_flags(flags)
+        compile_flags.extend(["-g"] if self.settings.build_type == "Debug" else ["-O3", "-DNDEBUG"])
+        compile_flags.extend("-D%s" % define for define in self._package_defines())
+        self.run('%s -x c++-header %s -I"%s" "%s" -o "%s"'
+                 % (self._cxx_executable(), " ".join(compile_flags),
+                    os.path.join(self.source_folder, self.folder_name),
+                    os.path.join(folder, "boost_pch.hpp"), os.path.join(folder, "boost_pch.hpp.gch")))
+
+    def _find_tool(self, candidates):
+        for candidate in candidates:
+            if tools.which(candidate):
+                return candidate
+        raise Exception("None of %s found in PATH" % ", ".join(candidates))
+
+    def _build_per_library(self, b2_exe, flags):
+        """Builds every library as a separate b2 target, sharing the cpu_count jobs between a pool
+        of BOOST_BUILD_WORKERS concurrent targets. A library starts only when the libraries it
+        depends on are built, so concurrent b2 runs never build the same target. The libraries
+        already built with the same flags are recorded, so building again in the same build folder
+        after a failure (conan build) resumes from them"""
+        # Any change of the flags (options, settings) invalidates the libraries already built
+        build_key = hashlib.sha1(json.dumps([self.version, sorted(flags)]).encode()).hexdigest()
+        # b2 does not allow mixing --with-* and --without-*
+        flags = [flag for flag in flags if not flag.startswith("--without-")]
+        libs = [libname for libname in lib_list if not getattr(self.options, "without_%s" % libname)]
+        finished_file = os.path.join(self.build_folder, "finished_libraries.json")
+        finished = []
+        if os.path.exists(finished_file):
+            state = json.loads(tools.load(finished_file))
+            if state["key"] == build_key:
+                finished = state["libraries"]
+                self.output.info("Resuming build, already built: %s" % " ".join(sorted(finished)))
+        pending = [libname for libname in libs if libname not in finished]
+        if not pending:
+            return
+        deps = {libname: transitive_dependencies(libname) & set(libs) for libname in pending}
+
+        # The configuration checks (compiler features, zlib, bzip2, icu...) are cached in the build
+        # folder shared by the concurrent b2 runs. Run them all once, first: b2 runs them even with -n
+        with self._timed_phase("b2 configuration checks"):
+            self.run("%s -n -d0" % self._b2_command(b2_exe, flags + ["--with-%s" % libname for libname in pending], 1,
+                                                    build_pass="configure"))
+
+        workers = max(1, min(len(pending),
+                             int(os.environ.get("BOOST_BUILD_WORKERS", "4")), tools.cpu_count()))
+        jobs = max(1, tools.cpu_count() // workers)
+        # (library, (start, end) or the exception) of the libraries finished since the last check
+        done = []
+        condition = threading.Condition()
+
+        def build_library(libname):
+            start = time.time()
+            try:
+                self.run(self._b2_command(b2_exe, flags + ["--with-%s" % libname], jobs))
+                result = (start, time.time())
+            except Exception as exc:
+                result = exc
+            with condition:
+                if not isinstance(result, Exception):
+                    finished.append(libname)
+                    tools.save(finished_file, json.dumps({"key": build_key, "libraries": finished}))
+                done.append((libname, result))
+                condition.notify()
+
+        pool = ThreadPool(workers)
+        running, timings, failed, skipped = set(), {}, {}, []
+        try:
+            while True:
+                # Until nothing changes, skipping a library can skip the ones depending on it
+                scheduled = True
+                while scheduled:
+                    scheduled = False
+                    for libname in list(pending):
+                        if deps[libname] & (set(failed) | set(skipped)):
+                            pending.remove(libname)
+                            skipped.append(libname)
+                            scheduled = True
+                        elif not deps[libname] & (set(pending) | running):
+                            pending.remove(libname)
+                            running.add(libname)
+                            pool.apply_async(build_library, (libname,))
+                            scheduled = True
+                if not running:
+                    break
+                with condition:
+                    while not done:
+                        condition.wait()
+                    results = list(done)
+                    del done[:]
+                for libname, result in results:
+                    running.remove(libname)
+                    if isinstance(result, Exception):
+                        failed[libname] = result
+                    else:
+                        timings[libname] = result
+        finally:
+            pool.close()
+            pool.join()
+
+        self.output.info("Wall time per library:")
+        for libname, (start, end) in sorted(timings.items(), key=lambda item: item[1][0] - item[1][1]):
+            self.output.info("    %-16s %8.1fs" % (libname, end - start))
+            self._record_phase("b2 %s" % libname, start, end)
+        if failed:
+            raise Exception("Failed to build: %s. Not built because of them: %s"
+                            % (", ".join(sorted(failed)), ", ".join(sorted(skipped)) or "none"))
 
     def get_build_flags(self):
 
@@ -149,11 +749,40 @@ class BoostConan(ConanFile):
             except:
                 pass
 
+        cpu_flags = self._cpu_target_flags()
+        cxx_flags.extend(cpu_flags)
+
+        # multi_variant builds static and shared in the same b2 run, and its staging folder is keyed
+        # by these flags: they must not depend on shared. The flags of one link are harmless for the other
+        if self.options.get_safe("lto"):
+            cxx_flags.append("-flto")
+            if self.settings.compiler == "gcc" and (not self.options.shared or self.options.multi_variant):
+                # Keep regular objects too, so the static libraries also work in non LTO links
+                cxx_flags.append("-ffat-lto-objects")
+            # The code is generated at link time
+            flags.append('linkflags="%s"' % " ".join(["-flto"] + cpu_flags))
+
+        if self.options.get_safe("gc_sections"):
+            # Lets the linker drop the unused functions and data of the shared libraries
+            cxx_flags.extend(["-ffunction-sections", "-fdata-sections"])
+            if self.options.shared or self.options.multi_variant:  # Not used to create archives
+                flags.append('linkflags="%s"' % ("-Wl,-dead_strip" if self.settings.os == "Macos"
+                                                 else "-Wl,--gc-sections"))
+
         cxx_flags = 'cxxflags="%s"' % " ".join(cxx_flags) if cxx_flags else ""
         flags.append(cxx_flags)
 
         return flags
 
+    def _cpu_target_flags(self):
+        cpu_target = str(self.options.cpu_target)
+        if cpu_target == "generic":
+            return []
+        if self.settings.compiler == "Visual Studio":
+            # AVX-512 requires Visual Studio 2017 (15.3), see _validate_cpu_target()
+            return ["/arch:AVX512" if cpu_target == "skylake-avx512" else "/arch:AVX2"]
+        return ["-march=%s" % cpu_target, "-mtune=%s" % cpu_target]
+
     def get_build_cross_flags(self):
         arch = self.settings.get_safe('arch')
         flags = []
@@ -210,13 +839,24 @@ class BoostConan(ConanFile):
         exe = compiler_command or exe  # Prioritize CXX
         # Specify here the toolset with the binary if present if don't empty parameter : :
         contents += '\nusing "%s" : "%s" : ' % (toolset, version)
-        contents += ' "%s"' % exe.replace("\\", "/")
+        # b2 takes the compiler command as a list of tokens, e.g. CXX="ccache g++"
+        command = [exe] if os.path.exists(exe) else exe.split() or [exe]
+        launcher = self._compiler_cache_launcher()
+        if launcher and self._same_program(command[0], launcher):
+            launcher = None  # CXX already wraps the compiler with the cache
+        if launcher:
+            command.insert(0, launcher)
+        contents += "".join(' "%s"' % token.replace("\\", "/") for token in command)
 
         contents += " : \n"
-        if "AR" in os.environ:
-            contents += '<archiver>"%s" ' % tools.which(os.environ["AR"]).replace("\\", "/")
-        if "RANLIB" in os.environ:
-            contents += '<ranlib>"%s" ' % tools.which(os.environ["RANLIB"]).replace("\\", "/")
+        archiver, ranlib = os.environ.get("AR"), os.environ.get("RANLIB")
+        if self.options.get_safe("lto") and not archiver:
+            # The archives need the symbol table of the LTO objects
+            archiver, ranlib = self._lto_archiver_and_ranlib()
+        if archiver:
+            contents += '<archiver>"%s" ' % tools.which(archiver).replace("\\", "/")
+        if ranlib:
+            contents += '<ranlib>"%s" ' % tools.which(ranlib).replace("\\", "/")
         if "CXXFLAGS" in os.environ:
             contents += '<cxxflags>"%s" ' % os.environ["CXXFLAGS"]
         if "CFLAGS" in os.environ:
@@ -229,9 +869,52 @@ class BoostConan(ConanFile):
         filename = "%s/user-config.jam" % folder
         tools.save(filename,  contents)
 
+    @staticmethod
+    def _same_program(command, program):
+        """Whether command runs program, also through a symlink (e.g. the /usr/lib/ccache/g++ masquerade)"""
+        path = tools.which(command) or command
+        return os.path.exists(path) and os.path.realpath(path) == os.path.realpath(program)
+
+    def _lto_archiver_and_ranlib(self):
+        version = str(self.settings.compiler.version)
+        if self.settings.compiler == "gcc":
+            prefixes = ["gcc-%%s-%s" % version, "gcc-%%s-%s" % version.split(".")[0], "gcc-%s"]
+        elif self.settings.compiler == "clang":
+            prefixes = ["llvm-%%s-%s" % version, "llvm-%s"]
+        else:  # The apple-clang archiver handles LTO objects
+            return None, None
+        for prefix in prefixes:
+            if tools.which(prefix % "ar") and tools.which(prefix % "ranlib"):
+                return prefix % "ar", prefix % "ranlib"
+        raise Exception("lto=True but none of %s found in PATH" % ", ".join(prefix % "ar" for prefix in prefixes))
+
+    def _cxx_executable(self):
+        _, _, exe = self.get_toolset_version_and_exe()
+        return os.environ.get("CXX") or exe or self._default_cxx_executable(str(self.settings.compiler),
+                                                                            str(self.settings.compiler.version))
+
     def get_toolset_version_and_exe(self):
         compiler_version = str(self.settings.compiler.version)
         compiler = str(self.settings.compiler)
+        toolset, version, exe = self._get_toolset_version_and_exe(compiler, compiler_version)
+        if not exe and self._compiler_cache_launcher():
+            # The launcher needs an explicit compiler, b2 cannot detect it behind the cache
+            exe = self._default_cxx_executable(compiler, compiler_version)
+        return toolset, version, exe
+
+    def _default_cxx_executable(self, compiler, compiler_version):
+        if compiler == "gcc":
+            candidates = ["g++-%s" % compiler_version, "g++-%s" % compiler_version[0], "g++"]
+        elif compiler == "clang":
+            candidates = ["clang++-%s" % compiler_version, "clang++"]
+        else:
+            candidates = ["clang++" if compiler == "apple-clang" else "c++"]
+        for candidate in candidates:
+            if tools.which(candidate):
+                return candidate
+        return candidates[-1]
+
+    def _get_toolset_version_and_exe(self, compiler, compiler_version):
         if self.settings.compiler == "Visual Studio":
             cversion = self.settings.compiler.version
             _msvc_version = "14.1" if cversion == "15" else "%s.0" % cversion
@@ -256,6 +939,180 @@ class BoostConan(ConanFile):
         else:
             return compiler, compiler_version, ""
 
+    ##################### COMPILER CACHE METHODS ###########################
+
+    def _compiler_cache_launcher(self):
+        # Looked up once, it is needed by several build steps
+        if not hasattr(self, "_launcher"):
+            self._launcher = self._find_compiler_cache_launcher()
+        return self._launcher
+
+    def _find_compiler_cache_launcher(self):
+        cache = str(self.options.compiler_cache)
+        if cache == "none":
+            return None
+        if self.settings.compiler == "Visual Studio":
+            self.output.warn("compiler_cache=%s is not supported with Visual Studio, ignored" % cache)
+            return None
+        launcher = tools.which(cache)
+        if not launcher:
+            raise Exception("compiler_cache=%s but '%s' was not found in PATH" % (cache, cache))
+        return launcher
+
+    def _compiler_cache_env(self):
+        if not self._compiler_cache_launcher():
+            return {}
+        # One cache directory per profile, so different toolchains do not evict each other
+        profile = "%s-%s-%s-%s-%s" % (self.settings.os, self.settings.arch, self.settings.compiler,
+                                      self.settings.compiler.version,
+                                      self.settings.get_safe("compiler.libcxx"))
+        profile_hash = hashlib.sha1(profile.encode()).hexdigest()
+        base_dir = os.environ.get("BOOST_COMPILER_CACHE_DIR",
+                                  os.path.join(os.path.expanduser("~"), ".boost_compiler_cache"))
+        cache_dir = os.path.join(base_dir, profile_hash[:16])
+        if self.options.compiler_cache == "ccache":
+            # Relative paths let different package folders share the cached objects
+            return {"CCACHE_DIR": cache_dir,
+                    "CCACHE_BASEDIR": self.build_folder,
+                    "CCACHE_NOHASHDIR": "1"}
+        # The directory is fixed when the sccache server starts, so every profile gets its own server,
+        # shared by the concurrent builds of that profile and never restarted under them
+        port = int(os.environ.get("BOOST_SCCACHE_BASE_PORT", "4300")) + int(profile_hash[:8], 16) % 1000
+        return {"SCCACHE_DIR": cache_dir, "SCCACHE_SERVER_PORT": str(port)}
+
+    def _compiler_cache_command(self, action):
+        launcher = self._compiler_cache_launcher()
+        if not launcher:
+            return
+        if self.options.compiler_cache == "ccache":
+            args = {"zero": "-z", "stats": "-s"}[action]
+        elif action == "zero":
+            # The statistics of a running server belong to every build using it, they are not reset
+            try:
+                self.run('"%s" --start-server' % launcher)
+            except Exception:
+                self.output.info("sccache server already running on port %s" % os.environ.get("SCCACHE_SERVER_PORT"))
+            return
+        else:
+            args = "--show-stats"
+        if action == "stats":
+            self.output.info("Compiler cache statistics:")
+        self.run('"%s" %s' % (launcher, args))
+
+    ##################### BUILD REPORT METHODS ###########################
+
+    @contextmanager
+    def _timed_phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._record_phase(name, start, time.time())
+
+    def _record_phase(self, name, start, end):
+        report = self._load_build_report()
+        report["phases"].append({"name": name, "start": start, "duration": end - start})
+        self._save_build_report(report)
+
+    def _load_build_report(self):
+        path = os.path.join(self.build_folder, build_report_name)
+        if os.path.exists(path):
+            return json.loads(tools.load(path))
+        return {"phases": [], "peak_child_rss_kb": None, "libraries": {}, "translation_units": [], "actions": []}
+
+    def _save_build_report(self, report):
+        """build_report.json, plus build_report.trace.json to load in chrome://tracing"""
+        path = os.path.join(self.build_folder, build_report_name)
+        tools.save(path, json.dumps(report, indent=2))
+        actions = [action for action in report["actions"] if action["start"] is not None]
+        origin = min([phase["start"] for phase in report["phases"]] +
+                     [action["start"] for action in actions] or [0])
+        events = [{"name": phase["name"], "cat": "phase", "ph": "X", "pid": 1, "tid": 1,
+                   "ts": (phase["start"] - origin) * 1e6, "dur": phase["duration"] * 1e6}
+                  for phase in report["phases"]]
+        # One row per concurrent b2 action
+        lanes = []
+        for action in sorted(actions, key=lambda item: item["start"]):
+            lane = next((n for n, end in enumerate(lanes) if end <= action["start"]), len(lanes))
+            if lane == len(lanes):
+                lanes.append(0)
+            lanes[lane] = action["start"] + action["duration"]
+            events.append({"name": action["name"], "cat": action["kind"], "ph": "X", "pid": 2, "tid": lane,
+                           "ts": (action["start"] - origin) * 1e6, "dur": action["duration"] * 1e6,
+                           "args": {"library": action["library"], "target": action["target"],
+                                    "pass": action.get("pass")}})
+        tools.save(os.path.splitext(path)[0] + ".trace.json", json.dumps({"traceEvents": events}))
+        self.output.info("Build report: %s" % path)
+
+    def _record_b2_actions(self):
+        """Adds to the report the b2 actions recorded with --out-xml, aggregated per library and
+        ranking the translation units, and the peak RSS of the processes run by conan"""
+        report = self._load_build_report()
+        for filename in sorted(os.listdir(self.build_folder)):
+            if not (filename.startswith("b2-actions-") and filename.endswith(".xml")):
+                continue
+            try:
+                root = ElementTree.parse(os.path.join(self.build_folder, filename)).getroot()
+            except ElementTree.ParseError as exc:
+                self.output.warn("Cannot parse %s: %s" % (filename, exc))
+                continue
+            build_pass = filename[len("b2-actions-"):-len(".xml")].rsplit("-", 1)[0]
+            for element in root.iter("action"):
+                action = self._parse_b2_action(element)
+                action["pass"] = build_pass
+                report["actions"].append(action)
+
+        libraries = {}
+        for action in report["actions"]:
+            library = libraries.setdefault(action["library"] or "other", {"compile": 0.0, "link": 0.0})
+            library["compile" if action["kind"] == "compile" else "link"] += action["duration"]
+        report["libraries"] = libraries
+        compiles = [action for action in report["actions"] if action["kind"] == "compile"]
+        # With pgo, every translation unit is compiled by both passes
+        report["translation_units"] = [{"source": action["source"], "library": action["library"],
+                                        "pass": action["pass"], "duration": action["duration"],
+                                        "cpu": action["cpu"]}
+                                       for action in sorted(compiles, key=lambda item: -item["duration"])]
+
+        try:
+            import resource
+            # Largest RSS of the processes conan waited for: the compilers, but also bootstrap, the
+            # pgo training or the dependencies built before in the same conan run
+            peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            # Bytes in Macos, kilobytes elsewhere
+            report["peak_child_rss_kb"] = peak_rss // 1024 if self.settings.os == "Macos" else peak_rss
+        except ImportError:  # Windows
+            pass
+        self._save_build_report(report)
+
+        if report["translation_units"]:
+            self.output.info("Slowest translation units:")
+        for unit in report["translation_units"][:10]:
+            self.output.info("    %8.1fs %s%s" % (unit["duration"], unit["source"],
+                                                  "" if unit["pass"] == "build" else " (%s)" % unit["pass"]))
+
+    @staticmethod
+    def _parse_b2_action(element):
+        name = element.findtext("name") or ""
+        target = element.findtext("path") or element.findtext("target") or ""
+        sources = [source.text or "" for source in element.iter("source")]
+        cpu = sum(float(element.get(attr) or 0) for attr in ("user", "system"))
+        start = end = None
+        for timestamp_format in ("%Y-%m-%d %H:%M:%SZ", "%Y-%m-%d %H:%M:%S +0000", "%Y-%m-%d %H:%M:%S"):
+            try:
+                epoch = datetime(1970, 1, 1)
+                start = (datetime.strptime(element.get("start"), timestamp_format) - epoch).total_seconds()
+                end = (datetime.strptime(element.get("end"), timestamp_format) - epoch).total_seconds()
+                break
+            except (TypeError, ValueError):
+                continue
+        duration = max(end - start, cpu) if start is not None else cpu
+        kind = "compile" if ".compile" in name else "link" if ("link" in name or "archive" in name) else "other"
+        library = re.search(r"libs[/\\]([^/\\]+)[/\\]", " ".join(sources + [target]))
+        return {"name": name, "kind": kind, "target": target, "source": sources[0] if sources else target,
+                "library": library.group(1) if library else None,
+                "start": start, "duration": duration, "cpu": cpu}
+
     ##################### BOOSTRAP METHODS ###########################
     def _get_boostrap_toolset(self):
         if self.settings.os == "Windows" and self.settings.compiler == "Visual Studio":
@@ -267,6 +1124,12 @@ class BoostConan(ConanFile):
         return with_toolset
 
     def bootstrap(self):
+        cache_dir = os.environ.get("BOOST_B2_CACHE")
+        if cache_dir:
+            cached = self._cached_b2(cache_dir)
+            if cached:
+                return cached
+
         folder = os.path.join(self.source_folder, self.folder_name, "tools", "build")
         try:
             bootstrap = "bootstrap.bat" if tools.os_info.is_windows else "./bootstrap.sh"
@@ -281,15 +1144,70 @@ class BoostConan(ConanFile):
             if os.path.join(folder, "bootstrap.log"):
                 self.output.warn(tools.load(os.path.join(folder, "bootstrap.log")))
             raise
-        return os.path.join(folder, "b2.exe") if tools.os_info.is_windows else os.path.join(folder, "b2")
+        b2_exe = os.path.join(folder, "b2.exe") if tools.os_info.is_windows else os.path.join(folder, "b2")
+        if cache_dir:
+            self._store_b2(cache_dir, b2_exe)
+        return b2_exe
+
+    def _b2_cache_folder(self, cache_dir):
+        # b2 only depends on the Boost version and the host toolchain, not on the package options
+        key = "%s|%s|%s|%s|%s" % (self.version, platform.system(), platform.machine(),
+                                  self._get_boostrap_toolset(), self.settings.compiler.version)
+        return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+    def _cached_b2(self, cache_dir):
+        folder = self._b2_cache_folder(cache_dir)
+        b2_exe = os.path.join(folder, "b2.exe" if tools.os_info.is_windows else "b2")
+        stamp_path = os.path.join(folder, "b2.json")
+        if not os.path.exists(stamp_path) or not os.path.exists(b2_exe):
+            self.output.info("b2 cache miss: %s" % folder)
+            return None
+        stamp = json.loads(tools.load(stamp_path))
+        if stamp.get("version") != self.version or stamp.get("sha256") != tools.sha256sum(b2_exe):
+            self.output.warn("Ignoring cached b2 %s, it does not match Boost %s" % (b2_exe, self.version))
+            return None
+        with open(os.devnull, "w") as devnull:
+            if subprocess.call([b2_exe, "-v"], stdout=devnull, stderr=devnull) != 0:
+                self.output.warn("Ignoring cached b2 %s, it does not run" % b2_exe)
+                return None
+        self.output.info("Using cached b2: %s" % b2_exe)
+        return b2_exe
+
+    def _store_b2(self, cache_dir, b2_exe):
+        folder = self._b2_cache_folder(cache_dir)
+        cached = os.path.join(folder, os.path.basename(b2_exe))
+        tools.mkdir(folder)
+        tmp = cache_tmp_path(cached)
+        shutil.copy2(b2_exe, tmp)
+        atomic_move(tmp, cached)
+        # Written last, so a complete stamp always describes a complete binary
+        tmp = cache_tmp_path(os.path.join(folder, "b2.json"))
+        tools.save(tmp, json.dumps({"version": self.version, "sha256": tools.sha256sum(cached)}))
+        atomic_move(tmp, os.path.join(folder, "b2.json"))
+        self.output.info("Stored b2 in cache: %s" % cached)
 
     ####################################################################
 
     def package(self):
         # This stage/lib is in source_folder... Face palm, looks like it builds in build but then
         # copy to source with the good lib name
+        start = time.time()
         out_lib_dir = os.path.join(self.folder_name, "stage", "lib")
-        self.copy(pattern="*", dst="include/boost", src="%s/boost" % self.folder_name)
+        pruned = self._pruned_headers()
+        if self.options.multi_variant and not self.options.header_only:
+            self._package_multi_variant()
+        if self.options.shared_headers and not self.options.header_only:
+            pass  # Provided by boost_headers
+        elif self.options.headers_packaging == "link":
+            self._link_headers(pruned)
+        else:
+            self.copy(pattern="*", dst="include/boost", src="%s/boost" % self.folder_name)
+            for path in pruned:
+                path = os.path.join(self.package_folder, "include", "boost", path)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
         if not self.options.shared:
             self.copy(pattern="*.a", dst="lib", src=out_lib_dir, keep_path=False)
         self.copy(pattern="*.so", dst="lib", src=out_lib_dir, keep_path=False, symlinks=True)
@@ -297,69 +1215,236 @@ class BoostConan(ConanFile):
         self.copy(pattern="*.dylib*", dst="lib", src=out_lib_dir, keep_path=False)
         self.copy(pattern="*.lib", dst="lib", src=out_lib_dir, keep_path=False)
         self.copy(pattern="*.dll", dst="bin", src=out_lib_dir, keep_path=False)
+        self.copy(pattern="*", dst="pch", src="pch", keep_path=False)
+
+        self._record_phase("package copy", start, time.time())
 
         # When first call with source do not package anything
-        if not os.path.exists(os.path.join(self.package_folder, "lib")):
-            return
+        renames = {}
+        if os.path.exists(os.path.join(self.package_folder, "lib")):
+            if not self.options.multi_variant:  # The shared libraries reference their tagged names
+                with self._timed_phase("renames"):
+                    renames = self.renames_to_make_cmake_find_package_happy()
+            if self.options.get_safe("strip") or self.options.get_safe("split_debug"):
+                with self._timed_phase("strip"):
+                    self._reduce_binaries()
+        self.write_manifest(renames)
+
+    def _reduce_binaries(self):
+        """Strips the packaged libraries, moving their debug info to BOOST_DEBUG_INFO_DIR/<package id>
+        with split_debug, to be packaged as boost_debuginfo (see build.py), and reports the sizes before
+        and after"""
+        strip = os.environ.get("STRIP", "strip")
+        objcopy = os.environ.get("OBJCOPY", "objcopy")
+        debug_dir = os.path.join(os.environ.get("BOOST_DEBUG_INFO_DIR",
+                                                os.path.join(os.path.expanduser("~"), ".boost_debug_info")),
+                                 self.info.package_id())
+        macos = self.settings.os == "Macos"
+        sizes = {}
+        for folder in ("lib", "bin"):
+            folder = os.path.join(self.package_folder, folder)
+            if not os.path.exists(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                path = os.path.join(folder, filename)
+                if os.path.islink(path) or not re.search(r"\.(a|so(\.[\d.]+)?|dylib|dll)$", filename):
+                    continue
+                static = filename.endswith(".a")
+                before = os.path.getsize(path)
+                if self.options.split_debug:
+                    tools.mkdir(debug_dir)
+                    debug_file = os.path.join(debug_dir, filename)
+                    if static:  # The debug link does not apply to archives, keep a full copy
+                        shutil.copy2(path, debug_file)
+                    elif macos:
+                        self.run('dsymutil "%s" -o "%s.dSYM"' % (path, debug_file))
+                    else:
+                        self.run('%s --only-keep-debug --compress-debug-sections "%s" "%s.debug"'
+                                 % (objcopy, path, debug_file))
+                if static or not self.options.strip:
+                    strip_args = "-S" if macos else "--strip-debug"
+                else:
+                    strip_args = "-x" if macos else "--strip-unneeded"
+                self.run('%s %s "%s"' % (strip, strip_args, path))
+                if self.options.split_debug and not static and not macos:
+                    # So gdb finds it in its debug-file-directory
+                    with tools.chdir(debug_dir):
+                        self.run('%s --add-gnu-debuglink="%s.debug" "%s"' % (objcopy, filename, path))
+                sizes[filename] = {"before": before, "after": os.path.getsize(path)}
+
+        self.output.info("Library sizes (KB):")
+        for filename, size in sorted(sizes.items()):
+            self.output.info("    %-50s %10d => %10d" % (filename, size["before"] // 1024, size["after"] // 1024))
+        self.output.info("    %-50s %10d => %10d" % ("TOTAL", sum(size["before"] for size in sizes.values()) // 1024,
+                                                    sum(size["after"] for size in sizes.values()) // 1024))
+        if self.options.split_debug:
+            self.output.info("Debug info: %s, package it with: conan export-pkg boost_debuginfo.py <user>/<channel> "
+                             '-bf "%s" -o boost_debuginfo:boost_package_id=%s' % (debug_dir, debug_dir,
+                                                                                 self.info.package_id()))
+        report = self._load_build_report()
+        report["sizes"] = sizes
+        self._save_build_report(report)
 
-        self.renames_to_make_cmake_find_package_happy()
+    def _pruned_headers(self):
+        if not self.options.prune_headers or self.options.header_only:
+            return []
+        return [os.path.normpath(path) for libname, paths in sorted(lib_headers.items())
+                if getattr(self.options, "without_%s" % libname) for path in paths]
+
+    def _link_headers(self, pruned):
+        """Reflinks (copy on write clones), or hardlinks, or copies when not in the same filesystem, the
+        headers from the source folder. Hardlinked headers share their inode with the build folder"""
+        src_root = os.path.join(self.source_folder, self.folder_name, "boost")
+        dst_root = os.path.join(self.package_folder, "include", "boost")
+        methods = ["reflink", "link", "copy"]
+        counts = dict.fromkeys(methods, 0)
+
+        for root, dirs, files in os.walk(src_root):
+            rel_root = os.path.relpath(root, src_root)
+            dirs[:] = [d for d in dirs if os.path.normpath(os.path.join(rel_root, d)) not in pruned]
+            for filename in files:
+                rel_path = os.path.normpath(os.path.join(rel_root, filename))
+                if rel_path in pruned:
+                    continue
+                src = os.path.join(root, filename)
+                dst = os.path.join(dst_root, rel_path)
+                tools.mkdir(os.path.dirname(dst))
+                if os.path.exists(dst):
+                    os.remove(dst)
+                while True:
+                    try:
+                        self._place_header(methods[0], src, dst)
+                        break
+                    except (AttributeError, ImportError, IOError, OSError):
+                        if len(methods) == 1:
+                            raise
+                        # Not supported here or across filesystems, do not try again for each file
+                        methods.pop(0)
+                counts[methods[0]] += 1
+
+        self.output.info("Headers packaging: %(reflink)s reflinked, %(link)s linked, %(copy)s copied" % counts)
+
+    @staticmethod
+    def _place_header(method, src, dst):
+        if method == "link":
+            os.link(src, dst)
+        elif method == "reflink":
+            import fcntl
+            with open(src, "rb") as src_file:
+                with open(dst, "wb") as dst_file:
+                    try:
+                        fcntl.ioctl(dst_file.fileno(), 0x40049409, src_file.fileno())  # FICLONE
+                    except (IOError, OSError):
+                        dst_file.close()
+                        os.remove(dst)
+                        raise
+        else:
+            shutil.copy2(src, dst)
 
     def renames_to_make_cmake_find_package_happy(self):
         # CMake findPackage help
-        renames = []
-        for libname in os.listdir(os.path.join(self.package_folder, "lib")):
-            new_name = libname
-            libpath = os.path.join(self.package_folder, "lib", libname)
+        lib_folder = os.path.join(self.package_folder, "lib")
+        existing = set(os.listdir(lib_folder))
+        renames = {}
+        for libname in sorted(existing):
             if "-" in libname:
                 new_name = libname.split("-", 1)[0] + "." + libname.split(".")[-1]
                 if new_name.startswith("lib"):
                     new_name = new_name[3:]
-            renames.append([libpath, os.path.join(self.package_folder, "lib", new_name)])
-
-        for original, new in renames:
-            if original != new and not os.path.exists(new):
-                self.output.info("Rename: %s => %s" % (original, new))
-                os.rename(original, new)
-
-    def package_info(self):
-        gen_libs = tools.collect_libs(self)
-
-        # List of lists, so if more than one matches the lib like serialization and wserialization
-        # both will be added to the list
-        ordered_libs = [[] for _ in range(len(lib_list))]
-
-        # The order is important, reorder following the lib_list order
-        missing_order_info = []
-        for real_lib_name in gen_libs:
-            for pos, alib in enumerate(lib_list):
-                if os.path.splitext(real_lib_name)[0].split("-")[0].endswith(alib):
-                    ordered_libs[pos].append(real_lib_name)
-                    break
-            else:
-                # self.output.info("Missing in order: %s" % real_lib_name)
-                if "_exec_monitor" not in real_lib_name:  # https://github.com/bincrafters/community/issues/94
-                    missing_order_info.append(real_lib_name)  # Assume they do not depend on other
-
-        # Flat the list and append the missing order
-        self.cpp_info.libs = [item for sublist in ordered_libs
-                                      for item in sublist if sublist] + missing_order_info
+                if new_name not in existing:
+                    self.output.info("Rename: %s => %s" % (libname, new_name))
+                    os.rename(os.path.join(lib_folder, libname), os.path.join(lib_folder, new_name))
+                    existing.remove(libname)
+                    existing.add(new_name)
+                    renames[libname] = new_name
+        return renames
 
+    def write_manifest(self, renames):
+        """Records the packaged libraries, so package_info(), evaluated by every consumer, does not
+        need to look for them in the package folder"""
+        lib_folder = os.path.join(self.package_folder, "lib")
+        artifacts = sorted(os.listdir(lib_folder)) if os.path.exists(lib_folder) else []
+        # Same names than tools.collect_libs()
+        gen_libs = []
+        for artifact in artifacts:
+            name, ext = os.path.splitext(artifact)
+            if ext in (".so", ".lib", ".a", ".dylib"):
+                gen_libs.append(name[3:] if ext != ".lib" and name.startswith("lib") else name)
         if self.options.without_test:  # remove boost_unit_test_framework
-            self.cpp_info.libs = [lib for lib in self.cpp_info.libs if "unit_test" not in lib]
+            gen_libs = [lib for lib in gen_libs if "unit_test" not in lib]
+        libs, components = self._order_libraries(gen_libs)
 
-        self.output.info("LIBRARIES: %s" % self.cpp_info.libs)
-        self.output.info("Package folder: %s" % self.package_folder)
+        manifest = {"artifacts": artifacts,
+                    "libs": libs,
+                    "components": components,
+                    "renames": renames,
+                    "defines": self._package_defines(),
+                    # boost_package_id option of the boost_debuginfo package
+                    "debuginfo": self.info.package_id() if self.options.get_safe("split_debug") else None}
+        tools.save(os.path.join(self.package_folder, manifest_name), json.dumps(manifest, indent=2))
 
+    def _package_defines(self):
+        defines = []
         if not self.options.header_only and self.options.shared:
-            self.cpp_info.defines.append("BOOST_ALL_DYN_LINK")
+            defines.append("BOOST_ALL_DYN_LINK")
         else:
-            self.cpp_info.defines.append("BOOST_USE_STATIC_LIBS")
+            defines.append("BOOST_USE_STATIC_LIBS")
 
         if not self.options.header_only:
             if not self.options.without_python:
                 if not self.options.shared:
-                    self.cpp_info.defines.append("BOOST_PYTHON_STATIC_LIB")
+                    defines.append("BOOST_PYTHON_STATIC_LIB")
 
             if self.settings.compiler == "Visual Studio":
                 # DISABLES AUTO LINKING! NO SMART AND MAGIC DECISIONS THANKS!
-                self.cpp_info.defines.extend(["BOOST_ALL_NO_LIB"])
+                defines.extend(["BOOST_ALL_NO_LIB"])
+        return defines
+
+    @staticmethod
+    def _order_libraries(gen_libs):
+        """Library files in linkage order (following lib_list) and the link list of every library"""
+        ordered = []
+        # Assume the unknown ones do not depend on others
+        missing_order_info = []
+        for real_lib_name in gen_libs:
+            found = artifact_library(real_lib_name)
+            if found:
+                ordered.append((found[0], found[1], real_lib_name))
+            elif not any(excluded in real_lib_name for excluded in excluded_artifacts):
+                missing_order_info.append(real_lib_name)
+        ordered.sort()
+
+        components = {}
+        for _, libname, _ in ordered:
+            if libname not in components:
+                deps = transitive_dependencies(libname)
+                components[libname] = [lib for _, dep, lib in ordered if dep == libname or dep in deps]
+        return [lib for _, _, lib in ordered] + missing_order_info, components
+
+    def package_info(self):
+        manifest_path = os.path.join(self.package_folder, manifest_name)
+        if os.path.exists(manifest_path):
+            manifest = json.loads(tools.load(manifest_path))
+            self.cpp_info.libs, components = manifest["libs"], manifest["components"]
+            self.cpp_info.defines.extend(manifest["defines"])
+            if manifest.get("debuginfo"):
+                self.user_info.debuginfo_package_id = manifest["debuginfo"]
+        else:  # Packaged before the manifest existed
+            gen_libs = tools.collect_libs(self)
+            if self.options.without_test:  # remove boost_unit_test_framework
+                gen_libs = [lib for lib in gen_libs if "unit_test" not in lib]
+            self.cpp_info.libs, components = self._order_libraries(gen_libs)
+            self.cpp_info.defines.extend(self._package_defines())
+
+        # Per library link lists, including the libraries they depend on, so consumers can link
+        # only what they use, e.g. ${CONAN_USER_BOOST_libs_filesystem} with the cmake generator
+        for libname, libs in components.items():
+            setattr(self.user_info, "libs_%s" % libname, ";".join(libs))
+
+        # include(${CONAN_USER_BOOST_pch_cmake}) then boost_target_precompiled_headers(<target>)
+        if self.options.get_safe("precompiled_headers") and not self.options.header_only:
+            self.user_info.pch_header = os.path.join(self.package_folder, "pch", "boost_pch.hpp")
+            self.user_info.pch_cmake = os.path.join(self.package_folder, "pch", "boost_pch.cmake")
+
+        self.output.info("LIBRARIES: %s" % self.cpp_info.libs)
+        self.output.info("Package folder: %s" % self.package_folder)
@@ -0,0 +1,183 @@
+// Training workload of the profile guided (pgo option) builds of Boost. It only exercises the hot
+// paths of the libraries that were built, selected with the TRAIN_* definitions.
+#include <cstdlib>
+#include <iostream>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#ifdef TRAIN_REGEX
+#include <boost/regex.hpp>
+#endif
+#ifdef TRAIN_FILESYSTEM
+#include <boost/filesystem.hpp>
+#endif
+#ifdef TRAIN_IOSTREAMS
+#include <boost/iostreams/copy.hpp>
+#include <boost/iostreams/filter/gzip.hpp>
+#include <boost/iostreams/filter/zlib.hpp>
+#include <boost/iostreams/filtering_stream.hpp>
+#ifdef TRAIN_BZIP2
+#include <boost/iostreams/filter/bzip2.hpp>
+#endif
+#endif
+#ifdef TRAIN_SERIALIZATION
+#include <boost/archive/binary_iarchive.hpp>
+#include <boost/archive/binary_oarchive.hpp>
+#include <boost/archive/text_iarchive.hpp>
+#include <boost/archive/text_oarchive.hpp>
+#include <boost/serialization/string.hpp>
+#include <boost/serialization/vector.hpp>
+#endif
+
+static std::string numbered(const char* prefix, int i)
+{
+    std::ostringstream name;
+    name << prefix << i;
+    return name.str();
+}
+
+static std::vector<std::string> corpus()
+{
+    // Deterministic, so the profiles are reproducible
+    std::vector<std::string> lines;
+    unsigned seed = 42;
+    for (int i = 0; i < 20000; ++i) {
+        seed = seed * 1103515245u + 12345u;
+        std::ostringstream line;
+        if (seed % 3 == 0)
+            line << "Subject: Re: message " << seed % 1000 << " about item-" << i;
+        else if (seed % 3 == 1)
+            line << "From: user" << seed % 97 << "@example.com, id=" << seed;
+        else
+            line << "2018-01-" << (i % 28 + 10) << " 12:" << (i % 50 + 10) << " value " << seed % 100000;
+        lines.push_back(line.str());
+    }
+    return lines;
+}
+
+#ifdef TRAIN_REGEX
+static std::size_t train_regex(const std::vector<std::string>& lines)
+{
+    const boost::regex subject("^Subject: (Re: |Aw: )*(.*)");
+    const boost::regex email("(\\w+)@(\\w+)\\.com");
+    const boost::regex date("(\\d{4})-(\\d{2})-(\\d{2})");
+    std::size_t matches = 0;
+    for (int round = 0; round < 5; ++round) {
+        for (std::size_t i = 0; i < lines.size(); ++i) {
+            boost::smatch what;
+            matches += boost::regex_match(lines[i], what, subject);
+            matches += boost::regex_search(lines[i], what, email);
+            matches += boost::regex_search(lines[i], what, date);
+        }
+    }
+    return matches;
+}
+#endif
+
+#ifdef TRAIN_FILESYSTEM
+static std::size_t train_filesystem()
+{
+    namespace fs = boost::filesystem;
+    const fs::path root = fs::temp_directory_path() / fs::unique_path("boost-pgo-%%%%-%%%%");
+    for (int i = 0; i < 20; ++i) {
+        const fs::path dir = root / numbered("dir", i) / "sub";
+        fs::create_directories(dir);
+        for (int j = 0; j < 20; ++j) {
+            fs::ofstream file(dir / (numbered("file", j) + ".txt"));
+            file << j;
+        }
+    }
+    std::size_t entries = 0;
+    for (int round = 0; round < 10; ++round) {
+        for (fs::recursive_directory_iterator it(root), end; it != end; ++it) {
+            entries += fs::is_regular_file(it->status()) ? it->path().extension().string().size() : 1;
+        }
+    }
+    fs::remove_all(root);
+    return entries;
+}
+#endif
+
+#ifdef TRAIN_IOSTREAMS
+template <typename Compressor, typename Decompressor>
+static std::size_t round_trip(const std::string& data)
+{
+    namespace io = boost::iostreams;
+    std::stringstream compressed, decompressed;
+    {
+        io::filtering_ostream out;
+        out.push(Compressor());
+        out.push(compressed);
+        out << data;
+    }
+    io::filtering_istream in;
+    in.push(Decompressor());
+    in.push(compressed);
+    io::copy(in, decompressed);
+    return decompressed.str().size();
+}
+
+static std::size_t train_iostreams(const std::vector<std::string>& lines)
+{
+    namespace io = boost::iostreams;
+    std::string data;
+    for (std::size_t i = 0; i < lines.size(); ++i)
+        data += lines[i] + "\n";
+    std::size_t size = 0;
+    for (int round = 0; round < 3; ++round) {
+        size += round_trip<io::gzip_compressor, io::gzip_decompressor>(data);
+        size += round_trip<io::zlib_compressor, io::zlib_decompressor>(data);
+#ifdef TRAIN_BZIP2
+        size += round_trip<io::bzip2_compressor, io::bzip2_decompressor>(data);
+#endif
+    }
+    return size;
+}
+#endif
+
+#ifdef TRAIN_SERIALIZATION
+template <typename OArchive, typename IArchive>
+static std::size_t round_trip(const std::vector<std::string>& lines)
+{
+    std::stringstream stream;
+    {
+        OArchive out(stream);
+        out << lines;
+    }
+    std::vector<std::string> loaded;
+    IArchive in(stream);
+    in >> loaded;
+    return loaded.size();
+}
+
+static std::size_t train_serialization(const std::vector<std::string>& lines)
+{
+    std::size_t size = 0;
+    for (int round = 0; round < 5; ++round) {
+        size += round_trip<boost::archive::text_oarchive, boost::archive::text_iarchive>(lines);
+        size += round_trip<boost::archive::binary_oarchive, boost::archive::binary_iarchive>(lines);
+    }
+    return size;
+}
+#endif
+
+int main()
+{
+    const std::vector<std::string> lines = corpus();
+    std::size_t result = 0;
+#ifdef TRAIN_REGEX
+    result += train_regex(lines);
+#endif
+#ifdef TRAIN_FILESYSTEM
+    result += train_filesystem();
+#endif
+#ifdef TRAIN_IOSTREAMS
+    result += train_iostreams(lines);
+#endif
+#ifdef TRAIN_SERIALIZATION
+    result += train_serialization(lines);
+#endif
+    std::cout << "PGO training done (" << result << ")" << std::endl;
+    return EXIT_SUCCESS;
+}
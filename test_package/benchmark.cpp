@@ -0,0 +1,243 @@
+// Benchmarks of the hot paths of the compiled Boost libraries, enabled with the BENCH_* definitions.
+// Usage: benchmark <results.json> [corpus file]
+#include <algorithm>
+#include <chrono>
+#include <cstdlib>
+#include <fstream>
+#include <functional>
+#include <iostream>
+#include <sstream>
+#include <string>
+#include <utility>
+#include <vector>
+
+#ifdef BENCH_REGEX
+#include <boost/regex.hpp>
+#endif
+#ifdef BENCH_IOSTREAMS
+#include <boost/iostreams/copy.hpp>
+#include <boost/iostreams/filter/zlib.hpp>
+#include <boost/iostreams/filtering_stream.hpp>
+#ifdef BENCH_BZIP2
+#include <boost/iostreams/filter/bzip2.hpp>
+#endif
+#endif
+#ifdef BENCH_SERIALIZATION
+#include <boost/archive/binary_iarchive.hpp>
+#include <boost/archive/binary_oarchive.hpp>
+#include <boost/archive/text_iarchive.hpp>
+#include <boost/archive/text_oarchive.hpp>
+#include <boost/serialization/string.hpp>
+#include <boost/serialization/vector.hpp>
+#endif
+#ifdef BENCH_FILESYSTEM
+#include <boost/filesystem.hpp>
+#endif
+#ifdef BENCH_LOG
+#include <boost/log/core.hpp>
+#include <boost/log/sinks/sync_frontend.hpp>
+#include <boost/log/sinks/text_ostream_backend.hpp>
+#include <boost/log/sources/logger.hpp>
+#include <boost/log/sources/record_ostream.hpp>
+#include <boost/make_shared.hpp>
+#endif
+
+typedef std::chrono::steady_clock Clock;
+
+// Keeps the results alive, so the compiler cannot drop the measured work
+static volatile long long keep_alive = 0;
+
+struct Result
+{
+    std::string name;
+    double ns_per_op;
+    long long operations;
+};
+
+// Best time per operation of several rounds, each of them long enough to be measured reliably
+static Result measure(const std::string& name, const std::function<long long()>& round)
+{
+    long long operations = 0;
+    double best = 0;
+    for (int i = 0; i < 5; ++i) {
+        const Clock::time_point start = Clock::now();
+        const long long done = round();
+        const double elapsed = std::chrono::duration<double, std::nano>(Clock::now() - start).count();
+        operations += done;
+        if (i == 0 || elapsed / done < best)
+            best = elapsed / done;
+    }
+    std::cout << name << ": " << best << " ns/op" << std::endl;
+    Result result = {name, best, operations};
+    return result;
+}
+
+static std::vector<std::string> corpus(const char* path)
+{
+    std::vector<std::string> seed;
+    if (path) {
+        std::ifstream file(path);
+        std::string line;
+        while (std::getline(file, line))
+            seed.push_back(line);
+    }
+    seed.push_back("Subject: Re: Aw: benchmark of the regex library");
+    seed.push_back("From: someone@example.com, 2018-01-15 12:30");
+    std::vector<std::string> lines;
+    for (int i = 0; lines.size() < 20000; ++i)
+        lines.push_back(seed[i % seed.size()] + " " + std::to_string(i));
+    return lines;
+}
+
+static std::string joined(const std::vector<std::string>& lines)
+{
+    std::string data;
+    for (std::size_t i = 0; i < lines.size(); ++i)
+        data += lines[i] + "\n";
+    return data;
+}
+
+#ifdef BENCH_IOSTREAMS
+template <typename Compressor, typename Decompressor>
+static long long compression_round_trip(const std::string& data)
+{
+    namespace io = boost::iostreams;
+    std::stringstream compressed, decompressed;
+    {
+        io::filtering_ostream out;
+        out.push(Compressor());
+        out.push(compressed);
+        out << data;
+    }
+    io::filtering_istream in;
+    in.push(Decompressor());
+    in.push(compressed);
+    io::copy(in, decompressed);
+    if (decompressed.str() != data)
+        throw std::runtime_error("compression round trip mismatch");
+    return static_cast<long long>(data.size());  // Per byte
+}
+#endif
+
+#ifdef BENCH_SERIALIZATION
+template <typename OArchive, typename IArchive>
+static long long serialization_round_trip(const std::vector<std::string>& lines)
+{
+    std::stringstream stream;
+    {
+        OArchive out(stream);
+        out << lines;
+    }
+    std::vector<std::string> loaded;
+    IArchive in(stream);
+    in >> loaded;
+    return static_cast<long long>(loaded.size());  // Per element
+}
+#endif
+
+int main(int argc, const char* argv[])
+{
+    if (argc < 2) {
+        std::cerr << "Usage: " << argv[0] << " <results.json> [corpus file]" << std::endl;
+        return EXIT_FAILURE;
+    }
+    const std::vector<std::string> lines = corpus(argc > 2 ? argv[2] : 0);
+    std::vector<Result> results;
+
+#ifdef BENCH_REGEX
+    const boost::regex subject("^Subject: (Re: |Aw: )*(.*)");
+    const boost::regex email("(\\w+)@(\\w+)\\.com");
+    results.push_back(measure("regex_match", [&]() {
+        long long matched = 0;
+        for (std::size_t i = 0; i < lines.size(); ++i) {
+            boost::smatch what;
+            matched += boost::regex_match(lines[i], what, subject);
+        }
+        keep_alive += matched;
+        return static_cast<long long>(lines.size());
+    }));
+    results.push_back(measure("regex_search", [&]() {
+        long long found = 0;
+        for (std::size_t i = 0; i < lines.size(); ++i) {
+            boost::smatch what;
+            found += boost::regex_search(lines[i], what, email);
+        }
+        keep_alive += found;
+        return static_cast<long long>(lines.size());
+    }));
+#endif
+
+#ifdef BENCH_IOSTREAMS
+    const std::string data = joined(lines);
+    results.push_back(measure("iostreams_zlib_round_trip", [&]() {
+        return compression_round_trip<boost::iostreams::zlib_compressor,
+                                      boost::iostreams::zlib_decompressor>(data);
+    }));
+#ifdef BENCH_BZIP2
+    results.push_back(measure("iostreams_bzip2_round_trip", [&]() {
+        return compression_round_trip<boost::iostreams::bzip2_compressor,
+                                      boost::iostreams::bzip2_decompressor>(data);
+    }));
+#endif
+#endif
+
+#ifdef BENCH_SERIALIZATION
+    results.push_back(measure("serialization_text_round_trip", [&]() {
+        return serialization_round_trip<boost::archive::text_oarchive,
+                                        boost::archive::text_iarchive>(lines);
+    }));
+    results.push_back(measure("serialization_binary_round_trip", [&]() {
+        return serialization_round_trip<boost::archive::binary_oarchive,
+                                        boost::archive::binary_iarchive>(lines);
+    }));
+#endif
+
+#ifdef BENCH_FILESYSTEM
+    namespace fs = boost::filesystem;
+    const fs::path root = fs::temp_directory_path() / fs::unique_path("boost-bench-%%%%-%%%%");
+    for (int i = 0; i < 20; ++i) {
+        const fs::path dir = root / ("dir" + std::to_string(i)) / "sub";
+        fs::create_directories(dir);
+        for (int j = 0; j < 50; ++j)
+            fs::ofstream(dir / ("file" + std::to_string(j) + ".txt")) << j;
+    }
+    results.push_back(measure("filesystem_traversal", [&]() {
+        long long entries = 0;
+        for (int round = 0; round < 10; ++round) {
+            for (fs::recursive_directory_iterator it(root), end; it != end; ++it) {
+                keep_alive += fs::is_regular_file(it->status());
+                ++entries;
+            }
+        }
+        return entries;  // Per directory entry
+    }));
+    fs::remove_all(root);
+#endif
+
+#ifdef BENCH_LOG
+    namespace logging = boost::log;
+    typedef logging::sinks::synchronous_sink<logging::sinks::text_ostream_backend> Sink;
+    boost::shared_ptr<std::ostringstream> log_stream = boost::make_shared<std::ostringstream>();
+    boost::shared_ptr<Sink> sink = boost::make_shared<Sink>();
+    sink->locked_backend()->add_stream(log_stream);
+    logging::core::get()->add_sink(sink);
+    logging::sources::logger logger;
+    results.push_back(measure("log_throughput", [&]() {
+        for (std::size_t i = 0; i < lines.size(); ++i)
+            BOOST_LOG(logger) << lines[i];
+        log_stream->str("");
+        return static_cast<long long>(lines.size());  // Per record
+    }));
+    logging::core::get()->remove_sink(sink);
+#endif
+
+    std::ofstream json(argv[1]);
+    json << "{\n";
+    for (std::size_t i = 0; i < results.size(); ++i) {
+        json << "  \"" << results[i].name << "\": {\"ns_per_op\": " << results[i].ns_per_op
+             << ", \"operations\": " << results[i].operations << "}"
+             << (i + 1 < results.size() ? "," : "") << "\n";
+    }
+    json << "}\n";
+    return EXIT_SUCCESS;
+}
@@ -1,3 +1,4 @@
+import json
 import platform
 
 from conans.client.run_environment import RunEnvironment
@@ -23,6 +24,14 @@ class DefaultNameConan(ConanFile):
             cmake.definitions["HEADER_ONLY"] = "TRUE"
         if self.options["boost"].python:
             cmake.definitions["WITH_PYTHON"] = "TRUE"
+        if self._benchmark:
+            cmake.definitions["BENCHMARK"] = "TRUE"
+            for lib in ("regex", "iostreams", "serialization", "filesystem", "log"):
+                if not getattr(self.options["boost"], "without_%s" % lib):
+                    cmake.definitions["BENCH_%s" % lib.upper()] = "TRUE"
+            # bzip2 is only configured in Linux and Macos
+            if not self.options["boost"].without_iostreams and platform.system() in ("Linux", "Darwin"):
+                cmake.definitions["BENCH_BZIP2"] = "TRUE"
 
         cmake.configure()
         cmake.build()
@@ -36,8 +45,61 @@ class DefaultNameConan(ConanFile):
                 self.run('DYLD_LIBRARY_PATH=%s ctest --output-on-error -C %s' % (lpath, bt))
             else:
                 self.run('ctest --output-on-error -C %s' % bt)
+            if self._benchmark:
+                self._run_benchmark()
             if self.options["boost"].python:
                 os.chdir("bin")
                 sys.path.append(".")
                 import hello_ext
                 hello_ext.greet()
+
+    @property
+    def _benchmark(self):
+        return os.environ.get("BOOST_BENCHMARK") and not self.options["boost"].header_only
+
+    def _run_benchmark(self):
+        """Runs the benchmarks and compares them with the baseline of the same configuration stored
+        in BOOST_BENCHMARK_BASELINE, failing when one of them is slower than the baseline by more
+        than BOOST_BENCHMARK_THRESHOLD. BOOST_BENCHMARK_UPDATE stores the results as baseline"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        results_file = os.path.abspath("benchmark_results.json")
+        self.run('"%s" "%s" "%s"' % (os.path.join("bin", "benchmark"), results_file,
+                                     os.path.join(here, "data.txt")))
+        with open(results_file) as f:
+            results = json.load(f)
+
+        baseline_file = os.environ.get("BOOST_BENCHMARK_BASELINE",
+                                       os.path.join(here, "benchmark_baseline.json"))
+        baselines = {}
+        if os.path.exists(baseline_file):
+            with open(baseline_file) as f:
+                baselines = json.load(f)
+        boost = self.options["boost"]
+        key = "%s-%s-%s-%s-%s-%s%s" % (self.settings.os, self.settings.arch, self.settings.compiler,
+                                       self.settings.compiler.version, self.settings.build_type,
+                                       "shared" if boost.shared else "static",
+                                       "-fPIC" if boost.get_safe("fPIC") else "")
+        if os.environ.get("BOOST_BENCHMARK_UPDATE"):
+            baselines[key] = results
+            with open(baseline_file, "w") as f:
+                json.dump(baselines, f, indent=2, sort_keys=True)
+            self.output.info("Benchmark baseline of %s stored in %s" % (key, baseline_file))
+            return
+
+        baseline = baselines.get(key)
+        if not baseline:
+            self.output.warn("No benchmark baseline for %s in %s" % (key, baseline_file))
+            return
+        threshold = float(os.environ.get("BOOST_BENCHMARK_THRESHOLD", "0.1"))
+        regressions = []
+        for name, result in sorted(results.items()):
+            if name not in baseline:
+                continue
+            change = result["ns_per_op"] / baseline[name]["ns_per_op"] - 1
+            self.output.info("%-32s %12.2f ns/op, baseline %12.2f ns/op (%+.1f%%)"
+                             % (name, result["ns_per_op"], baseline[name]["ns_per_op"], change * 100))
+            if change > threshold:
+                regressions.append(name)
+        if regressions:
+            raise Exception("Benchmarks slower than the baseline by more than %.0f%%: %s"
+                            % (threshold * 100, ", ".join(regressions)))